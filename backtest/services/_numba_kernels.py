@@ -0,0 +1,497 @@
+"""
+Metric 클래스에서 사용하는 numba 커널 모음
+
+모든 커널은 명시적 시그니처로 import 시점에 컴파일되고 디스크에 캐시되며,
+GIL을 해제하므로 여러 포트폴리오의 지표를 스레드로 병렬 계산할 수 있음
+수익률 기반 커널은 float32 입력(Metric(use_float32=True))도 받고, 누적은 float64로 함
+"""
+import numpy as np
+
+from numba import njit, types
+from numba.types import float32, float64, int64, Tuple, UniTuple
+
+# NaN을 결과로 사용하는 커널이 있으므로 nnan/ninf를 제외한 fastmath 옵션만 사용
+FASTMATH = {'nsz', 'arcp', 'contract', 'afn', 'reassoc'}
+# 0으로 나누면 예외 대신 pandas처럼 inf/NaN을 반환하도록 numpy 오류 모델 사용
+# boundscheck를 끄므로 롤링 커널은 window < 1을 직접 검사해 전부 NaN을 반환함 (pandas rolling(0)과 동일)
+JIT_OPTIONS = dict(cache=True, nogil=True, fastmath=FASTMATH, boundscheck=False,
+                   error_model='numpy')
+
+# 입력 배열은 읽기 전용으로 선언해야 일반 배열과 pandas의 읽기 전용 .values를 모두 받음
+f8_array = types.Array(float64, 1, 'A', readonly=True)
+f4_array = types.Array(float32, 1, 'A', readonly=True)
+i8_array = types.Array(int64, 1, 'A', readonly=True)
+
+NS_PER_DAY = 86400 * 10**9
+
+@njit(float64[:](f8_array), **JIT_OPTIONS)
+def _calc_drawdown(rets: np.ndarray) -> np.ndarray:
+    # 누적수익률과 최고점을 한 번에 갱신하는 drawdown (NaN은 건너뜀)
+    result = np.empty(rets.shape[0])
+    cum_rets, peak = 1.0, -np.inf
+    for i in range(rets.shape[0]):
+        if np.isnan(rets[i]):
+            result[i] = np.nan
+            continue
+        cum_rets *= 1 + rets[i]
+        peak = max(peak, cum_rets)
+        result[i] = cum_rets / peak - 1
+    return result
+
+@njit(int64[:](f8_array, i8_array), **JIT_OPTIONS)
+def _ddur(dd: np.ndarray, days_i8: np.ndarray) -> np.ndarray:
+    # drawdown이 0이 되면 초기화되는 연속 drawdown 일수
+    ddur = np.zeros(dd.shape[0], dtype=np.int64)
+    for i in range(1, dd.shape[0]):
+        if dd[i] != 0:
+            ddur[i] = ddur[i - 1] + (days_i8[i] - days_i8[i - 1]) // NS_PER_DAY
+    return ddur
+
+@njit([UniTuple(float64, 2)(f8_array, float64),
+      UniTuple(float64, 2)(f4_array, float64)], **JIT_OPTIONS)
+def _var_cvar(rets: np.ndarray, delta: float):
+    # 부분 정렬(partition)로 VaR(선형보간 분위수)과 CVaR를 함께 계산 (NaN은 제외)
+    buffer = rets[~np.isnan(rets)]
+    n = buffer.shape[0]
+    if n == 0:
+        return np.nan, np.nan
+    
+    h = (n - 1) * delta
+    lo = int(np.floor(h))
+    part = np.partition(buffer, lo)
+    VaR = part[lo]
+    if lo + 1 < n:
+        VaR += (h - lo) * (part[lo + 1:].min() - part[lo])
+    
+    total, count = 0.0, 0
+    for r in buffer:
+        if r <= VaR:
+            total += r
+            count += 1
+    return VaR, total / count if count > 0 else np.nan
+
+@njit([float64(f8_array, float64),
+      float64(f4_array, float64)], **JIT_OPTIONS)
+def _cvar(rets: np.ndarray, delta: float) -> float:
+    # VaR 이하 수익률의 평균
+    return _var_cvar(rets, delta)[1]
+
+@njit([float64(f8_array),
+      float64(f4_array)], **JIT_OPTIONS)
+def _hit(rets: np.ndarray) -> float:
+    # 0이 아닌 수익률 중 양수 수익률의 비율
+    n_pos, n_nonzero = 0, 0
+    for r in rets:
+        n_pos += r > 0.0
+        n_nonzero += r != 0.0
+    return n_pos / n_nonzero if n_nonzero > 0 else np.nan
+
+@njit([float64(f8_array),
+      float64(f4_array)], **JIT_OPTIONS)
+def _gpr(rets: np.ndarray) -> float:
+    # 양수 수익률 평균 / 음수 수익률 평균(절대값)
+    sum_pos, n_pos, sum_neg, n_neg = 0.0, 0, 0.0, 0
+    for r in rets:
+        if r > 0.0:
+            sum_pos += r
+            n_pos += 1
+        elif r < 0.0:
+            sum_neg += r
+            n_neg += 1
+    if n_pos == 0 or n_neg == 0:
+        return np.nan
+    return (sum_pos / n_pos) / -(sum_neg / n_neg)
+
+@njit([types.boolean[:](f8_array, int64),
+      types.boolean[:](f4_array, int64)], **JIT_OPTIONS)
+def _full_windows(rets: np.ndarray, window: int) -> np.ndarray:
+    # NaN 없이 window개가 채워진 윈도우의 마지막 위치 (pandas의 min_periods=window 기준)
+    n = rets.shape[0]
+    full = np.zeros(n, dtype=np.bool_)
+    if window < 1:
+        return full
+    n_nan = 0
+    for i in range(n):
+        n_nan += np.isnan(rets[i])
+        if i >= window:
+            n_nan -= np.isnan(rets[i - window])
+        full[i] = i >= window - 1 and n_nan == 0
+    return full
+
+@njit([float64[:](f8_array, int64),
+      float64[:](f4_array, int64)], **JIT_OPTIONS)
+def _rolling_hit(rets: np.ndarray, window: int) -> np.ndarray:
+    # 윈도우마다 _hit 계산
+    result = np.full(rets.shape[0], np.nan)
+    if window < 1:
+        return result
+    full = _full_windows(rets, window)
+    for i in range(window - 1, rets.shape[0]):
+        if full[i]:
+            result[i] = _hit(rets[i - window + 1:i + 1])
+    return result
+
+@njit([float64[:](f8_array, int64),
+      float64[:](f4_array, int64)], **JIT_OPTIONS)
+def _rolling_gpr(rets: np.ndarray, window: int) -> np.ndarray:
+    # 윈도우마다 _gpr 계산
+    result = np.full(rets.shape[0], np.nan)
+    if window < 1:
+        return result
+    full = _full_windows(rets, window)
+    for i in range(window - 1, rets.shape[0]):
+        if full[i]:
+            result[i] = _gpr(rets[i - window + 1:i + 1])
+    return result
+
+@njit([float64[:](f8_array, int64, float64),
+      float64[:](f4_array, int64, float64)], **JIT_OPTIONS)
+def _rolling_cvar(rets: np.ndarray, window: int, delta: float) -> np.ndarray:
+    # 윈도우마다 _cvar 계산
+    result = np.full(rets.shape[0], np.nan)
+    if window < 1:
+        return result
+    full = _full_windows(rets, window)
+    for i in range(window - 1, rets.shape[0]):
+        if full[i]:
+            result[i] = _cvar(rets[i - window + 1:i + 1], delta)
+    return result
+
+@njit(float64[:](f8_array, int64), **JIT_OPTIONS)
+def _rolling_min(arr: np.ndarray, window: int) -> np.ndarray:
+    # 단조 증가 deque를 이용한 O(n) 롤링 최솟값 (NaN이 있는 윈도우는 NaN)
+    n = arr.shape[0]
+    result = np.full(n, np.nan)
+    if window < 1:
+        # pandas rolling(0).min()과 같이 전부 NaN
+        return result
+    full = _full_windows(arr, window)
+    deque = np.empty(n, dtype=np.int64)
+    head, tail = 0, 0
+    for i in range(n):
+        if not np.isnan(arr[i]):
+            while tail > head and arr[deque[tail - 1]] >= arr[i]:
+                tail -= 1
+            deque[tail] = i
+            tail += 1
+        if tail > head and deque[head] <= i - window:
+            head += 1
+        if full[i]:
+            result[i] = arr[deque[head]]
+    return result
+
+# Kahan 보정이 fastmath의 재결합(reassoc)으로 사라지지 않도록 분산 상태 갱신은 fastmath 없이 컴파일
+EXACT_JIT_OPTIONS = dict(JIT_OPTIONS, fastmath=False)
+
+@njit(**EXACT_JIT_OPTIONS)
+def _var_add(x, nobs, mean, m2, compensation, prev, n_same):
+    # 롤링 분산 상태에 값 추가 (pandas의 add_var와 같은 Kahan 보정 Welford, NaN은 건너뜀)
+    if np.isnan(x):
+        return nobs, mean, m2, compensation, prev, n_same
+    nobs += 1
+    n_same = n_same + 1 if x == prev else 1
+    prev_mean = mean - compensation
+    y = x - compensation
+    t = y - mean
+    compensation = t + mean - y
+    mean += t / nobs
+    m2 += (x - prev_mean) * (x - mean)
+    return nobs, mean, m2, compensation, x, n_same
+
+@njit(**EXACT_JIT_OPTIONS)
+def _var_remove(x, nobs, mean, m2, compensation):
+    # 롤링 분산 상태에서 값 제거 (pandas의 remove_var)
+    if np.isnan(x):
+        return nobs, mean, m2, compensation
+    nobs -= 1
+    if nobs == 0:
+        return 0, 0.0, 0.0, compensation
+    prev_mean = mean - compensation
+    y = x - compensation
+    t = y - mean
+    compensation = t + mean - y
+    mean -= t / nobs
+    m2 -= (x - prev_mean) * (x - mean)
+    return nobs, mean, m2, compensation
+
+@njit(**EXACT_JIT_OPTIONS)
+def _window_moments(values: np.ndarray, start: int, end: int):
+    # values[start:end]의 개수, 평균, 편차제곱합을 두 번 순회로 정확히 계산 (NaN 제외)
+    nobs, total = 0, 0.0
+    for j in range(start, end):
+        if not np.isnan(values[j]):
+            nobs += 1
+            total += values[j]
+    if nobs == 0:
+        return 0, 0.0, 0.0
+    mean = total / nobs
+    m2 = 0.0
+    for j in range(start, end):
+        if not np.isnan(values[j]):
+            m2 += (values[j] - mean) ** 2
+    return nobs, mean, m2
+
+@njit(**EXACT_JIT_OPTIONS)
+def _var_slide(values: np.ndarray, i: int, window: int, nobs, mean, m2,
+               add_comp, remove_comp, prev, n_same):
+    """롤링 분산 상태를 i번째 윈도우로 이동 (values[i - window] 제거, values[i] 추가)
+    
+    제거 후 편차제곱합이 크게 줄면(큰 값이 빠져 상쇄 오차가 남는 경우) 윈도우를 다시 계산함
+    """
+    if i >= window:
+        prev_m2 = m2
+        nobs, mean, m2, remove_comp = _var_remove(float(values[i - window]), nobs, mean, m2, remove_comp)
+        if m2 < prev_m2 * 1e-8:
+            nobs, mean, m2 = _window_moments(values, i - window + 1, i)
+            add_comp, remove_comp = 0.0, 0.0
+    nobs, mean, m2, add_comp, prev, n_same = _var_add(float(values[i]), nobs, mean, m2,
+                                                      add_comp, prev, n_same)
+    return nobs, mean, m2, add_comp, remove_comp, prev, n_same
+
+@njit(**EXACT_JIT_OPTIONS)
+def _var_result(nobs, m2, n_same):
+    # 표본분산(ddof=1), 윈도우 값이 모두 같으면 0이고 음수 반올림 오차는 0으로 자름
+    if nobs < 2:
+        return np.nan
+    if n_same >= nobs:
+        return 0.0
+    return max(m2, 0.0) / (nobs - 1)
+
+@njit([float64[:](f8_array, int64, int64),
+      float64[:](f4_array, int64, int64)], **JIT_OPTIONS)
+def _rolling_cagr(rets: np.ndarray, window: int, scale: int) -> np.ndarray:
+    # 로그수익률의 롤링 합으로 계산하는 롤링 CAGR (NaN이 있는 윈도우는 NaN)
+    n = rets.shape[0]
+    result = np.full(n, np.nan)
+    if window < 1:
+        return result
+    full = _full_windows(rets, window)
+    sum_log, n_nonzero = 0.0, 0
+    for i in range(n):
+        r = float(rets[i])
+        n_nonzero += r != 0.0
+        if not np.isnan(r):
+            sum_log += np.log1p(r)
+        if i >= window:
+            old = float(rets[i - window])
+            n_nonzero -= old != 0.0
+            if not np.isnan(old):
+                sum_log -= np.log1p(old)
+        if n_nonzero == 0:
+            # 수익률이 모두 0인 윈도우는 pandas처럼 CAGR이 정확히 0이 되도록 누적 오차 제거
+            sum_log = 0.0
+        
+        if full[i]:
+            result[i] = np.exp(sum_log * scale / window) - 1
+    return result
+
+@njit([float64[:](f8_array, int64, float64, int64),
+      float64[:](f4_array, int64, float64, int64)], **JIT_OPTIONS)
+def _rolling_sharpe(rets: np.ndarray, window: int,
+                    yearly_rfr: float, scale: int) -> np.ndarray:
+    # 롤링 CAGR(_rolling_cagr)과 롤링 표준편차(Welford)로 계산
+    n = rets.shape[0]
+    result = np.full(n, np.nan)
+    if window < 1:
+        return result
+    full = _full_windows(rets, window)
+    CAGR = _rolling_cagr(rets, window, scale)
+    nobs, mean, m2, prev, n_same = 0, 0.0, 0.0, np.nan, 0
+    add_comp, remove_comp = 0.0, 0.0
+    for i in range(n):
+        nobs, mean, m2, add_comp, remove_comp, prev, n_same = _var_slide(
+            rets, i, window, nobs, mean, m2, add_comp, remove_comp, prev, n_same)
+        if full[i]:
+            vol = np.sqrt(_var_result(nobs, m2, n_same) * scale)
+            result[i] = (CAGR[i] - yearly_rfr) / vol
+    return result
+
+@njit([float64(f8_array, int64),
+      float64(f4_array, int64)], **JIT_OPTIONS)
+def _downside_std(rets: np.ndarray, scale: int) -> float:
+    # 양수 수익률을 0으로 둔 수익률의 연율화 표준편차, 입력은 변경하지 않음 (NaN 제외)
+    nobs, total = 0, 0.0
+    for r in rets:
+        if not np.isnan(r):
+            nobs += 1
+            total += min(r, 0.0)
+    if nobs < 2:
+        return np.nan
+    mean = total / nobs
+    m2 = 0.0
+    for r in rets:
+        if not np.isnan(r):
+            m2 += (min(r, 0.0) - mean) ** 2
+    return np.sqrt(m2 / (nobs - 1) * scale)
+
+@njit([float64[:](f8_array, int64, int64),
+      float64[:](f4_array, int64, int64)], **JIT_OPTIONS)
+def _rolling_downside_std(rets: np.ndarray, window: int, scale: int) -> np.ndarray:
+    # _downside_std의 롤링 버전 (NaN이 있는 윈도우는 NaN)
+    n = rets.shape[0]
+    result = np.full(n, np.nan)
+    if window < 1:
+        return result
+    full = _full_windows(rets, window)
+    downside = np.minimum(rets.astype(np.float64), 0.0)
+    nobs, mean, m2, prev, n_same = 0, 0.0, 0.0, np.nan, 0
+    add_comp, remove_comp = 0.0, 0.0
+    for i in range(n):
+        nobs, mean, m2, add_comp, remove_comp, prev, n_same = _var_slide(
+            downside, i, window, nobs, mean, m2, add_comp, remove_comp, prev, n_same)
+        if full[i]:
+            result[i] = np.sqrt(_var_result(nobs, m2, n_same) * scale)
+    return result
+
+@njit([Tuple((int64, float64, float64, float64))(f8_array),
+      Tuple((int64, float64, float64, float64))(f4_array)], **JIT_OPTIONS)
+def _central_moments(rets: np.ndarray):
+    # NaN을 제외한 개수, 2/3/4차 중심적률의 합
+    count, total = 0, 0.0
+    for r in rets:
+        if not np.isnan(r):
+            count += 1
+            total += r
+    mean = total / count if count > 0 else np.nan
+    m2, m3, m4 = 0.0, 0.0, 0.0
+    for r in rets:
+        if not np.isnan(r):
+            d = r - mean
+            d2 = d * d
+            m2 += d2
+            m3 += d2 * d
+            m4 += d2 * d2
+    return count, m2, m3, m4
+
+@njit([float64(f8_array),
+      float64(f4_array)], **JIT_OPTIONS)
+def _skew(rets: np.ndarray) -> float:
+    # pandas Series.skew와 같은 편향 보정 왜도
+    n, m2, m3, _ = _central_moments(rets)
+    if n < 3:
+        return np.nan
+    if m2 == 0:
+        return 0.0
+    return (n * (n - 1) ** 0.5 / (n - 2)) * (m3 / m2 ** 1.5)
+
+@njit([float64(f8_array),
+      float64(f4_array)], **JIT_OPTIONS)
+def _kurt(rets: np.ndarray) -> float:
+    # pandas Series.kurtosis와 같은 편향 보정 초과 첨도
+    n, m2, _, m4 = _central_moments(rets)
+    if n < 4:
+        return np.nan
+    denominator = (n - 2) * (n - 3) * m2 ** 2
+    if denominator == 0:
+        return 0.0
+    adj = 3 * (n - 1) ** 2 / ((n - 2) * (n - 3))
+    return n * (n + 1) * (n - 1) * m4 / denominator - adj
+
+@njit([UniTuple(float64[:], 7)(f8_array, f8_array, int64, int64, float64, float64, float64, int64),
+      UniTuple(float64[:], 7)(f4_array, f8_array, int64, int64, float64, float64, float64, int64)],
+      **JIT_OPTIONS)
+def _rolling_all(rets: np.ndarray, dd: np.ndarray, window: int, MDD_window: int,
+                 sharp_rfr: float, sortino_rfr: float, delta: float, scale: int):
+    """rolling_metric용 롤링 지표를 한 번의 윈도우 순회로 함께 계산
+    
+    윈도우에 값을 추가/제거하면서 로그수익률 합, 평균/분산(Welford), 하방 분산,
+    양수/음수 개수와 합, 정렬된 윈도우(VaR, CVaR)를 갱신함. NaN이 없는 입력을 가정함
+    
+    Returns:
+        sharp, sortino, VaR_ratio, CVaR_ratio, hit, GtP, calmar 배열
+    """
+    n = rets.shape[0]
+    sharp = np.full(n, np.nan)
+    sortino = np.full(n, np.nan)
+    VaR_ratio = np.full(n, np.nan)
+    CVaR_ratio = np.full(n, np.nan)
+    hit = np.full(n, np.nan)
+    GtP = np.full(n, np.nan)
+    calmar = np.full(n, np.nan)
+    MDD = _rolling_min(dd, MDD_window)
+    if window < 1:
+        # pandas rolling(0)과 같이 전부 NaN (크기 0인 정렬 버퍼에 쓰지 않도록 먼저 반환)
+        return sharp, sortino, VaR_ratio, CVaR_ratio, hit, GtP, calmar
+    
+    # 수익률과 하방 수익률의 롤링 분산 상태 (_rolling_sharpe, _rolling_downside_std와 동일)
+    downside = np.minimum(rets.astype(np.float64), 0.0)
+    nobs, mean, m2, add_comp, remove_comp, prev, n_same = 0, 0.0, 0.0, 0.0, 0.0, np.nan, 0
+    d_nobs, d_mean, d_m2, d_add_comp, d_remove_comp, d_prev, d_n_same = \
+        0, 0.0, 0.0, 0.0, 0.0, np.nan, 0
+    
+    sum_log = 0.0
+    n_pos, n_neg, n_nonzero = 0, 0, 0
+    sum_pos, sum_neg = 0.0, 0.0
+    
+    # 정렬된 윈도우 (삽입/삭제 위치는 이진 탐색)
+    ordered = np.empty(window)
+    size = 0
+    
+    h = (window - 1) * delta
+    lo = int(np.floor(h))
+    
+    for i in range(n):
+        nobs, mean, m2, add_comp, remove_comp, prev, n_same = _var_slide(
+            rets, i, window, nobs, mean, m2, add_comp, remove_comp, prev, n_same)
+        d_nobs, d_mean, d_m2, d_add_comp, d_remove_comp, d_prev, d_n_same = _var_slide(
+            downside, i, window, d_nobs, d_mean, d_m2,
+            d_add_comp, d_remove_comp, d_prev, d_n_same)
+        
+        r = float(rets[i])
+        sum_log += np.log1p(r)
+        n_pos += r > 0.0
+        n_neg += r < 0.0
+        n_nonzero += r != 0.0
+        if r > 0.0:
+            sum_pos += r
+        elif r < 0.0:
+            sum_neg += r
+        
+        if i >= window:
+            old = float(rets[i - window])
+            sum_log -= np.log1p(old)
+            n_pos -= old > 0.0
+            n_neg -= old < 0.0
+            n_nonzero -= old != 0.0
+            if old > 0.0:
+                sum_pos -= old
+            elif old < 0.0:
+                sum_neg -= old
+            
+            pos = np.searchsorted(ordered[:size], old)
+            for j in range(pos, size - 1):
+                ordered[j] = ordered[j + 1]
+            size -= 1
+        
+        if n_nonzero == 0:
+            # 수익률이 모두 0인 윈도우는 pandas처럼 CAGR이 정확히 0이 되도록 누적 오차 제거
+            sum_log = 0.0
+        
+        pos = np.searchsorted(ordered[:size], r)
+        for j in range(size, pos, -1):
+            ordered[j] = ordered[j - 1]
+        ordered[pos] = r
+        size += 1
+        
+        if i < window - 1:
+            continue
+        
+        CAGR = np.exp(sum_log * scale / window) - 1
+        sharp[i] = (CAGR - sharp_rfr) / np.sqrt(_var_result(nobs, m2, n_same) * scale)
+        sortino[i] = (CAGR - sortino_rfr) / np.sqrt(_var_result(d_nobs, d_m2, d_n_same) * scale)
+        calmar[i] = -CAGR / MDD[i]
+        
+        VaR = ordered[lo]
+        if lo + 1 < window:
+            VaR += (h - lo) * (ordered[lo + 1] - ordered[lo])
+        VaR_ratio[i] = -mean / VaR
+        
+        tail = np.searchsorted(ordered, VaR, side='right')
+        CVaR_ratio[i] = -mean / (ordered[:tail].sum() / tail)
+        
+        if n_nonzero > 0:
+            hit[i] = n_pos / n_nonzero
+        if n_pos > 0 and n_neg > 0:
+            GtP[i] = (sum_pos / n_pos) / -(sum_neg / n_neg)
+    
+    return sharp, sortino, VaR_ratio, CVaR_ratio, hit, GtP, calmar
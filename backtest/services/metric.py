@@ -4,7 +4,6 @@ import pandas as pd
 import seaborn as sns
 import yfinance as yf
 
-from itertools import groupby, chain
 from typing import Union
 
 # ## Project Path 추가
@@ -16,14 +15,25 @@ from typing import Union
 
 from core.scaling import convert_freq, annualize_scaler
 
+from backtest.services._numba_kernels import (
+    _calc_drawdown, _ddur, _var_cvar, _cvar,
+    _hit, _gpr, _rolling_hit, _rolling_gpr, _rolling_cvar,
+    _rolling_min, _rolling_cagr, _rolling_sharpe, _downside_std, _rolling_downside_std,
+    _skew, _kurt, _rolling_all,
+)
+
 class Metric:
     def __init__(self, portfolio: Union[pd.DataFrame, pd.Series],
-                 freq: str='month'):
+                 freq: str='month', use_float32: bool=False):
         """Metric class
 
         Args:
             portfolio (Union[pd.DataFrame, pd.Series]): 포트폴리오 자산별 가격 혹은 총자산 가격표.
             freq (str, optional): 데이터 수집 주기. Defaults to 'day'.
+            use_float32 (bool, optional):
+                True - 변동성, 샤프/소르티노, VaR/CVaR, hit, GtP 등을 float32 수익률로 계산(메모리 대역폭 절약)
+                False - 모든 지표를 float64로 계산
+                drawdown, MDD, CAGR은 누적 오차 때문에 항상 float64로 계산. Defaults to False.
         """
         if isinstance(portfolio, pd.DataFrame):
             self.portfolio = portfolio.sum(axis=1)
@@ -38,6 +48,11 @@ class Metric:
         
         self.rets = self.portfolio.pct_change().fillna(0)
         self.cum_rets = (1 + self.rets).cumprod()
+        self._rets_arr = self.rets.values.astype(np.float64, copy=False)
+        self._drawdown_arr = _calc_drawdown(self._rets_arr)
+        
+        if use_float32:
+            self._rets_arr = self._rets_arr.astype(np.float32)
     
     def calc_lookback(self, lookback, scale) -> int:
         # lookback을 주기에 맞게 변환해주는 함수
@@ -46,16 +61,25 @@ class Metric:
         elif isinstance(lookback, float):
             return int(lookback * scale)
     
+    def _values(self, returns) -> np.ndarray:
+        # 수익률을 배열로 변환 (인스턴스 수익률은 캐시된 배열 사용, 롤링 객체는 None)
+        if returns is self.rets:
+            return self._rets_arr
+        if isinstance(returns, (pd.Series, np.ndarray)):
+            return np.asarray(returns, dtype=np.float64)
+        return None
+    
+    def _drawdown_values(self, returns) -> np.ndarray:
+        # drawdown 배열 (인스턴스 수익률은 캐시된 배열을 그대로 사용하므로 읽기 전용으로 다룸)
+        if returns is self.rets:
+            return self._drawdown_arr
+        return _calc_drawdown(self._values(returns))
+    
     def rolling(func):
         # 옵션 활용을 위한 데코레이터
         def wrapper(self, returns=None, rolling=False, lookback=1, *args, **kwargs):
-            if returns is None:
-                rets = self.rets.copy()
-            else:
-                try:
-                    rets = returns.copy()
-                except AttributeError:
-                    rets = returns
+            # rolling 메서드도 수익률을 읽기만 하므로 복사하지 않음
+            rets = self.rets if returns is None else returns
             
             lookback = self.calc_lookback(lookback, self.param)
             
@@ -69,13 +93,8 @@ class Metric:
     def external(func):
         # 옵션 활용을 위한 데코레이터
         def wrapper(self, returns=None, *args, **kwargs):
-            if returns is None:
-                rets = self.rets.copy()
-            else:
-                try:
-                    rets = returns.copy()
-                except AttributeError:
-                    rets = returns
+            # external 메서드는 수익률을 읽기만 하므로 복사하지 않음
+            rets = self.rets if returns is None else returns
             
             result = func(self, returns=rets, *args, **kwargs)
             return result
@@ -83,16 +102,21 @@ class Metric:
     
     @external
     def CAGR(self, returns: pd.Series=None) -> float:
-        try:
-            return returns.add(1).prod() ** (self.param / len(returns)) - 1
-        except Exception:
-            return returns.apply(lambda x: self.CAGR(x))
+        rets = self._values(returns)
+        if rets is None:
+            # 롤링 객체는 원래 수익률 배열 위에서 로그수익률의 롤링 합으로 계산
+            CAGR = _rolling_cagr(self._values(returns.obj), returns.window, self.param)
+            return pd.Series(CAGR, index=returns.obj.index)
+        return np.nanprod(1.0 + rets.astype(np.float64, copy=False)) ** (self.param / rets.size) - 1
     
     @external
     def annualized_volatility(self, returns: pd.Series=None) -> float:
-        return returns.std() * np.sqrt(self.param)
+        rets = self._values(returns)
+        if rets is None:
+            return returns.std() * np.sqrt(self.param)
+        return np.nanstd(rets, ddof=1) * np.sqrt(self.param)
     
-    @rolling
+    @external
     def sharp_ratio(self, returns: pd.Series,
                     rolling: bool=False,
                     lookback: Union[float, int]=1,
@@ -118,9 +142,15 @@ class Metric:
                 - Series -> (lookback)년 롤링 연율화 샤프지수
                 - float -> 연율화 샤프지수
         '''
+        if rolling:
+            lookback = self.calc_lookback(lookback, self.param)
+            sharp = _rolling_sharpe(self._values(returns),
+                                    lookback, yearly_rfr, self.param)
+            return pd.Series(sharp, index=returns.index)
+        
         return (self.CAGR(returns) - yearly_rfr) / self.annualized_volatility(returns)
     
-    @rolling
+    @external
     def sortino_ratio(self, returns: pd.Series=None,
                       rolling: bool=False,
                       lookback: Union[float, int]=1,
@@ -146,14 +176,17 @@ class Metric:
                 - Series -> (lookback)년 롤링 연율화 소르티노 지수
                 - float -> 연율화 소르티노 지수
         """
-        def downside_std(returns):
-            try:
-                returns[returns >= 0] = 0
-                return returns.std() * np.sqrt(self.param)
-            except TypeError:
-                return returns.apply(lambda x: downside_std(x))
+        rets = self._values(returns)
+        if rolling:
+            lookback = self.calc_lookback(lookback, self.param)
+            CAGR = pd.Series(_rolling_cagr(rets, lookback, self.param), index=returns.index)
+            downside_std = pd.Series(_rolling_downside_std(rets, lookback, self.param),
+                                     index=returns.index)
+        else:
+            CAGR = self.CAGR(returns)
+            downside_std = _downside_std(rets, self.param)
         
-        return (self.CAGR(returns) - yearly_rfr) / downside_std(returns)
+        return (CAGR - yearly_rfr) / downside_std
 
     @external
     def calmar_ratio(self, returns: pd.Series=None,
@@ -182,20 +215,27 @@ class Metric:
                 - Series -> (lookback)년 롤링 연율화 칼머 지수
                 - float -> 연율화 칼머 지수
         '''
-        dd = self.drawdown(returns)
+        dd = self._drawdown_values(returns)
         lookback = self.calc_lookback(lookback, self.param)
         MDD_lookback = self.calc_lookback(MDD_lookback, self.param)
         
         if rolling:
-            returns = returns.rolling(lookback)
-            dd = dd.rolling(MDD_lookback)
+            CAGR = pd.Series(_rolling_cagr(self._values(returns), lookback, self.param),
+                             index=returns.index)
+            MDD = pd.Series(_rolling_min(dd, MDD_lookback), index=returns.index)
+        else:
+            CAGR = self.CAGR(returns)
+            MDD = np.nanmin(dd)
         
-        calmar = - self.CAGR(returns) / dd.min()
+        calmar = - CAGR / MDD
         return calmar
     
     @external
     def VaR(self, returns: pd.Series=None, delta: float=0.01):
-        return returns.quantile(delta)
+        rets = self._values(returns)
+        if rets is None:
+            return returns.quantile(delta)
+        return _var_cvar(rets, delta)[0]
     
     @rolling
     def VaR_ratio(self, returns: pd.Series=None, 
@@ -227,10 +267,12 @@ class Metric:
 
     @external
     def CVaR(self, returns: pd.Series=None, delta=0.01):
-        try:
-            return returns[returns <= self.VaR(returns, delta=delta)].mean()
-        except TypeError:
-            return returns.apply(lambda x: self.CVaR(x))
+        rets = self._values(returns)
+        if rets is None:
+            # 롤링 객체는 원래 수익률 배열 위에서 윈도우별로 계산
+            CVaR = _rolling_cvar(self._values(returns.obj), returns.window, delta)
+            return pd.Series(CVaR, index=returns.obj.index)
+        return _cvar(rets, delta)
 
     @rolling
     def CVaR_ratio(self, returns: pd.Series=None, 
@@ -257,11 +299,7 @@ class Metric:
                 - Series -> (lookback)년 롤링 연율화 CVaR 지수
                 - float -> 연율화 CVaR 지수
         """
-        if rolling:
-            ratio = -returns.mean() / returns.apply(lambda x: self.CVaR(x, delta=delta))
-        else:
-            ratio = -returns.mean() / self.CVaR(returns, delta=delta)
-            
+        ratio = -returns.mean() / self.CVaR(returns, delta=delta)
         return ratio
 
     @external
@@ -289,9 +327,11 @@ class Metric:
                 - Series -> (lookback)년 롤링 연율화 HR
                 - float -> 연율화 HR
         """
-        hit = lambda rets: len(rets[rets > 0.0]) / len(rets[rets != 0.0])
-        lookback = self.calc_lookback(lookback, self.param)
-        return returns.rolling(lookback).apply(hit) if rolling else hit(returns)
+        rets = self._values(returns)
+        if rolling:
+            lookback = self.calc_lookback(lookback, self.param)
+            return pd.Series(_rolling_hit(rets, lookback), index=returns.index)
+        return _hit(rets)
 
     @external
     def GtP_ratio(self, returns: pd.Series=None,
@@ -318,19 +358,21 @@ class Metric:
                 - Series -> (lookback)년 롤링 연율화 GPR
                 - float -> 연율화 GPR
         """
-        GPR = lambda rets: rets[rets > 0.0].mean() / -rets[rets < 0.0].mean()
-        lookback = self.calc_lookback(lookback, self.param)
-        return returns.rolling(lookback).apply(GPR) if rolling else GPR(returns)
+        rets = self._values(returns)
+        if rolling:
+            lookback = self.calc_lookback(lookback, self.param)
+            return pd.Series(_rolling_gpr(rets, lookback), index=returns.index)
+        return _gpr(rets)
     
     @external
     def skewness(self, returns: pd.Series=None) -> float:
         # skewness 계산 메서드
-        return self.rets.skew()
+        return _skew(self._values(returns))
     
     @external
     def kurtosis(self, returns: pd.Series=None) -> float:
         # kurtosis 계산 메서드
-        return self.rets.kurtosis()
+        return _kurt(self._values(returns))
     
     @external
     def drawdown(self, returns: pd.Series=None) -> pd.Series:
@@ -342,11 +384,14 @@ class Metric:
         Returns:
             - pd.Series: 주기에 따른 drawdown 리스트(Series)
         """
-        try:
-            cum_rets = (1 + returns).cumprod()
-            return cum_rets.div(cum_rets.cummax()).sub(1)
-        except TypeError:
+        if returns is self.rets:
+            # 반환값을 변경해도 캐시된 drawdown이 바뀌지 않도록 복사본으로 감쌈
+            return pd.Series(self._drawdown_arr.copy(), index=returns.index)
+        
+        rets = self._values(returns)
+        if rets is None:
             return returns.apply(self.drawdown)
+        return pd.Series(_calc_drawdown(rets), index=returns.index)
     
     @external
     def drawdown_duration(self, returns: pd.Series=None) -> pd.Series:
@@ -359,23 +404,15 @@ class Metric:
         Returns:
             - pd.Series: 주기에 따른 drawdown 지속시간 리스트(Series, 일 단위)
         """
-        dd = self.drawdown(returns=returns)
-        
-        ddur_count = list(chain.from_iterable((np.arange(len(list(j))) + 1).tolist() if i==1 else [0] * len(list(j)) for i, j in groupby(dd != 0)))
-        ddur_count = pd.Series(ddur_count, index=dd.index)
-        temp_df= ddur_count.reset_index()
-        temp_df.columns = ['date', 'counts']
-        
-        count_0 = temp_df.counts.apply(lambda x: 0 if x > 0 else 1)
-        cumdays = temp_df.date.diff().dt.days.fillna(0).astype(int).cumsum()
-        ddur = cumdays - (count_0 * cumdays).replace(0, np.nan).ffill().fillna(0).astype(int)
-        ddur.index = dd.index
+        dd = self._drawdown_values(returns)
+        days_i8 = returns.index.values.astype('datetime64[ns]').view('i8')
+        ddur = pd.Series(_ddur(dd, days_i8), index=returns.index)
         return ddur
     
     @external
     def MDD(self, returns: pd.Series=None) -> float:
         # MDD 계산 메서드
-        return self.drawdown(returns).min()
+        return np.nanmin(self._drawdown_values(returns))
     
     @external
     def MDD_duration(self, returns: pd.Series=None) -> float:
@@ -441,28 +478,41 @@ class Metric:
     def rolling_metric(self, returns: pd.Series=None,
                        lookback: Union[float, int]=1,
                        MDD_lookback: Union[float, int]=3,
-                       delta: float=0.01) -> pd.DataFrame:
-        rolling = True
-        
+                       delta: float=0.01,
+                       sharp_rfr: float=0.04,
+                       sortino_rfr: float=0.03) -> pd.DataFrame:
         dd = self.drawdown(returns)
         ddur = self.drawdown_duration(returns)
-        sharp = self.sharp_ratio(returns, rolling=rolling, lookback=lookback)
-        sortino = self.sortino_ratio(returns, rolling=rolling, lookback=lookback)
-        calmar = self.calmar_ratio(returns, rolling=rolling, 
-                                   lookback=lookback, MDD_lookback=MDD_lookback)
-        VaR = self.VaR(returns, delta=delta)
-        VaR_ratio = self.VaR_ratio(returns, rolling=rolling,
-                                   lookback=lookback, delta=delta)
-        CVaR = self.CVaR(returns, delta=delta)
-        CVaR_ratio = self.CVaR_ratio(returns, rolling=rolling,
-                                     lookback=lookback, delta=delta)
-        hit = self.hit_ratio(returns, rolling=rolling, lookback=lookback)
-        GtP = self.GtP_ratio(returns, rolling=rolling, lookback=lookback)
+        rets = self._values(self.rets if returns is None else returns)
+        
+        if np.isnan(rets).any():
+            # NaN이 있으면 윈도우별 NaN 처리를 위해 지표별 롤링 계산 사용
+            rolling = True
+            sharp = self.sharp_ratio(returns, rolling=rolling, 
+                                     lookback=lookback, yearly_rfr=sharp_rfr)
+            sortino = self.sortino_ratio(returns, rolling=rolling, 
+                                         lookback=lookback, yearly_rfr=sortino_rfr)
+            calmar = self.calmar_ratio(returns, rolling=rolling, 
+                                       lookback=lookback, MDD_lookback=MDD_lookback)
+            VaR_ratio = self.VaR_ratio(returns, rolling=rolling,
+                                       lookback=lookback, delta=delta)
+            CVaR_ratio = self.CVaR_ratio(returns, rolling=rolling,
+                                         lookback=lookback, delta=delta)
+            hit = self.hit_ratio(returns, rolling=rolling, lookback=lookback)
+            GtP = self.GtP_ratio(returns, rolling=rolling, lookback=lookback)
+        else:
+            # 한 번의 윈도우 순회로 모든 롤링 지표 계산
+            sharp, sortino, VaR_ratio, CVaR_ratio, hit, GtP, calmar = _rolling_all(
+                rets, dd.values.astype(np.float64, copy=False),
+                self.calc_lookback(lookback, self.param),
+                self.calc_lookback(MDD_lookback, self.param),
+                sharp_rfr, sortino_rfr, delta, self.param)
         
-        result = pd.concat([dd, ddur, sharp, sortino, calmar,
-                            VaR_ratio, CVaR_ratio, hit, GtP], axis=1)
-        result.columns = ['dd', 'ddur', 'sharp', 'sortino', 'calmar',
-                          'VaR_ratio', 'CVaR_ratio', 'hit', 'GtP']
+        result = pd.DataFrame({
+            'dd': dd, 'ddur': ddur, 'sharp': sharp, 'sortino': sortino,
+            'calmar': calmar, 'VaR_ratio': VaR_ratio, 'CVaR_ratio': CVaR_ratio,
+            'hit': hit, 'GtP': GtP
+        }, index=dd.index)
         return result
     
     def plot_report(self, returns: pd.Series=None,
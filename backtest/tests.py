@@ -1,3 +1,312 @@
-from django.test import TestCase
+import numpy as np
+import pandas as pd
 
-# Create your tests here.
+from django.test import SimpleTestCase
+
+from backtest.services.metric import Metric
+from backtest.services._numba_kernels import (
+    _calc_drawdown, _ddur, _var_cvar, _hit, _gpr, _rolling_hit, _rolling_gpr, _rolling_cvar,
+    _rolling_min, _rolling_cagr, _rolling_sharpe, _downside_std, _rolling_downside_std,
+    _skew, _kurt, _rolling_all,
+)
+
+WINDOW = 20
+MDD_WINDOW = 60
+SCALE = 252
+DELTA = 0.01
+
+
+def edge_returns() -> dict:
+    # 커널이 pandas와 달라지기 쉬운 입력 모음
+    rng = np.random.default_rng(0)
+    random = rng.normal(0.0004, 0.01, 300)
+    random[rng.random(300) < 0.05] = 0
+
+    nan = random.copy()
+    nan[[5, 120, 121, 122, 250]] = np.nan
+
+    return {
+        'random': random,
+        # 분산이 0인 윈도우가 생기는 구간
+        'flat': np.r_[rng.normal(0, 0.01, 100), np.zeros(100), rng.normal(0, 0.01, 100)],
+        # 예금처럼 수익률이 일정한 시계열
+        'constant': np.full(300, 0.03 / 252),
+        # NaN이 포함된 윈도우
+        'nan': nan,
+        'single': np.array([0.01]),
+    }
+
+
+def to_series(rets: np.ndarray) -> pd.Series:
+    return pd.Series(rets, index=pd.bdate_range('2020-01-01', periods=rets.shape[0]))
+
+
+# 커널 도입 이전 pandas 구현과 같은 계산식
+def drawdown_ref(rets: pd.Series) -> pd.Series:
+    cum_rets = (1 + rets).cumprod()
+    return cum_rets.div(cum_rets.cummax()).sub(1)
+
+def ddur_ref(dd: pd.Series) -> pd.Series:
+    days = dd.index.to_series().diff().dt.days.fillna(0)
+    days = days.where(dd != 0, 0)
+    return days.groupby((dd == 0).cumsum()).cumsum().astype(np.int64)
+
+def CVaR_ref(rets: pd.Series) -> float:
+    return rets[rets <= rets.quantile(DELTA)].mean()
+
+def hit_ref(rets: pd.Series) -> float:
+    n_nonzero = len(rets[rets != 0.0])
+    return len(rets[rets > 0.0]) / n_nonzero if n_nonzero > 0 else np.nan
+
+def GPR_ref(rets: pd.Series) -> float:
+    return rets[rets > 0.0].mean() / -rets[rets < 0.0].mean()
+
+def downside_ref(rets: pd.Series) -> pd.Series:
+    return rets.mask(rets >= 0, 0)
+
+def rolling_CAGR_ref(rets: pd.Series, window: int=WINDOW) -> pd.Series:
+    return rets.add(1).rolling(window).apply(np.prod, raw=True) ** (SCALE / window) - 1
+
+def rolling_all_ref(rets: pd.Series, window: int=WINDOW, MDD_window: int=MDD_WINDOW) -> dict:
+    # _rolling_all 반환 순서와 같은 순서의 pandas 롤링 지표
+    dd = drawdown_ref(rets)
+    rolling = rets.rolling(window)
+    CAGR = rolling_CAGR_ref(rets, window)
+    return {
+        'sharp': (CAGR - 0.04) / (rolling.std() * np.sqrt(SCALE)),
+        'sortino': (CAGR - 0.03) / (downside_ref(rets).rolling(window).std() * np.sqrt(SCALE)),
+        'VaR_ratio': -rolling.mean() / rolling.quantile(DELTA),
+        'CVaR_ratio': -rolling.mean() / rolling.apply(CVaR_ref),
+        'hit': rolling.apply(hit_ref),
+        'GtP': rolling.apply(GPR_ref),
+        'calmar': -CAGR / dd.rolling(MDD_window).min(),
+    }
+
+
+class KernelTestCase(SimpleTestCase):
+
+    def assertAllClose(self, actual, expected, rtol=1e-7, name=''):
+        np.testing.assert_allclose(np.asarray(actual, dtype=np.float64),
+                                   np.asarray(expected, dtype=np.float64),
+                                   rtol=rtol, atol=1e-12, equal_nan=True, err_msg=name)
+
+    def for_each_case(self, check, with_nan=True):
+        for name, rets in edge_returns().items():
+            if with_nan or not np.isnan(rets).any():
+                with self.subTest(case=name):
+                    check(name, rets, to_series(rets))
+
+
+class ScalarKernelTest(KernelTestCase):
+
+    def test_drawdown(self):
+        def check(name, rets, series):
+            self.assertAllClose(_calc_drawdown(rets), drawdown_ref(series), name=name)
+        self.for_each_case(check)
+
+    def test_drawdown_duration(self):
+        def check(name, rets, series):
+            dd = drawdown_ref(series)
+            days_i8 = dd.index.values.astype('datetime64[ns]').view('i8')
+            np.testing.assert_array_equal(_ddur(dd.values, days_i8), ddur_ref(dd).values)
+        self.for_each_case(check, with_nan=False)
+
+    def test_VaR_CVaR(self):
+        def check(name, rets, series):
+            VaR, CVaR = _var_cvar(rets, DELTA)
+            self.assertAllClose(VaR, series.quantile(DELTA), name=name)
+            self.assertAllClose(CVaR, CVaR_ref(series), name=name)
+        self.for_each_case(check)
+
+    def test_hit_GPR(self):
+        def check(name, rets, series):
+            self.assertAllClose(_hit(rets), hit_ref(series), name=name)
+            self.assertAllClose(_gpr(rets), GPR_ref(series), name=name)
+        self.for_each_case(check)
+
+    def test_downside_std(self):
+        def check(name, rets, series):
+            self.assertAllClose(_downside_std(rets, SCALE),
+                                downside_ref(series).std() * np.sqrt(SCALE), name=name)
+        self.for_each_case(check)
+
+    def test_skew_kurt(self):
+        def check(name, rets, series):
+            if name == 'constant':
+                # 0.03 / 252는 평균이 정확히 표현되지 않아 pandas 결과도 합산 순서에 따른
+                # 부동소수점 오차이므로 정확히 표현되는 상수로 비교
+                rets = np.full(300, 2.0 ** -13)
+                series = to_series(rets)
+            self.assertAllClose(_skew(rets), series.skew(), name=name)
+            self.assertAllClose(_kurt(rets), series.kurt(), name=name)
+        self.for_each_case(check)
+
+
+class RollingKernelTest(KernelTestCase):
+
+    def test_rolling_hit_GPR(self):
+        def check(name, rets, series):
+            rolling = series.rolling(WINDOW)
+            self.assertAllClose(_rolling_hit(rets, WINDOW), rolling.apply(hit_ref), name=name)
+            self.assertAllClose(_rolling_gpr(rets, WINDOW), rolling.apply(GPR_ref), name=name)
+        self.for_each_case(check)
+
+    def test_rolling_CVaR(self):
+        def check(name, rets, series):
+            self.assertAllClose(_rolling_cvar(rets, WINDOW, DELTA),
+                                series.rolling(WINDOW).apply(CVaR_ref), name=name)
+        self.for_each_case(check)
+
+    def test_rolling_min(self):
+        def check(name, rets, series):
+            dd = drawdown_ref(series)
+            self.assertAllClose(_rolling_min(dd.values, MDD_WINDOW),
+                                dd.rolling(MDD_WINDOW).min(), name=name)
+        self.for_each_case(check)
+
+    def test_rolling_min_window_edges(self):
+        # window가 0이면 전부 NaN, 1이면 원래 값, 시계열보다 길면 전부 NaN (pandas와 동일)
+        dd = drawdown_ref(to_series(edge_returns()['random']))
+        for window in (0, 1, dd.size + 1):
+            with self.subTest(window=window):
+                self.assertAllClose(_rolling_min(dd.values, window), dd.rolling(window).min())
+
+    def test_rolling_CAGR(self):
+        def check(name, rets, series):
+            self.assertAllClose(_rolling_cagr(rets, WINDOW, SCALE),
+                                rolling_CAGR_ref(series), name=name)
+        self.for_each_case(check)
+
+    def test_rolling_sharpe(self):
+        def check(name, rets, series):
+            expected = (rolling_CAGR_ref(series) - 0.04) \
+                / (series.rolling(WINDOW).std() * np.sqrt(SCALE))
+            self.assertAllClose(_rolling_sharpe(rets, WINDOW, 0.04, SCALE), expected, name=name)
+        self.for_each_case(check)
+
+    def test_rolling_downside_std(self):
+        def check(name, rets, series):
+            expected = downside_ref(series).rolling(WINDOW).std() * np.sqrt(SCALE)
+            self.assertAllClose(_rolling_downside_std(rets, WINDOW, SCALE), expected, name=name)
+        self.for_each_case(check)
+
+    def test_window_edges(self):
+        # window가 1보다 작으면 전부 NaN, 1과 시계열보다 긴 윈도우는 pandas와 비교
+        series = to_series(edge_returns()['nan'])
+        rets, n = series.values, series.size
+        for window in (-1, 0, 1, n + 1):
+            with self.subTest(window=window):
+                actual = {
+                    'hit': _rolling_hit(rets, window),
+                    'GtP': _rolling_gpr(rets, window),
+                    'CVaR': _rolling_cvar(rets, window, DELTA),
+                    'CAGR': _rolling_cagr(rets, window, SCALE),
+                    'sharp': _rolling_sharpe(rets, window, 0.04, SCALE),
+                    'downside_std': _rolling_downside_std(rets, window, SCALE),
+                }
+                if window < 1:
+                    expected = dict.fromkeys(actual, np.full(n, np.nan))
+                else:
+                    rolling = series.rolling(window)
+                    expected = {
+                        'hit': rolling.apply(hit_ref),
+                        'GtP': rolling.apply(GPR_ref),
+                        'CVaR': rolling.apply(CVaR_ref),
+                        'CAGR': rolling_CAGR_ref(series, window),
+                        'sharp': (rolling_CAGR_ref(series, window) - 0.04)
+                                 / (rolling.std() * np.sqrt(SCALE)),
+                        'downside_std': downside_ref(series).rolling(window).std()
+                                        * np.sqrt(SCALE),
+                    }
+                for key, value in expected.items():
+                    self.assertAllClose(actual[key], value, name=key)
+
+    def test_rolling_all(self):
+        # _rolling_all은 NaN 없는 입력만 받음 (NaN은 rolling_metric에서 지표별 계산으로 처리)
+        def check(name, rets, series):
+            dd = drawdown_ref(series)
+            actual = _rolling_all(rets, dd.values, WINDOW, MDD_WINDOW,
+                                  0.04, 0.03, DELTA, SCALE)
+            for (key, value), result in zip(rolling_all_ref(series).items(), actual):
+                self.assertAllClose(result, value, name=f'{name} {key}')
+        self.for_each_case(check, with_nan=False)
+
+    def test_rolling_all_window_edges(self):
+        # window/MDD_window가 0이면 전부 NaN, 1과 시계열보다 긴 윈도우는 pandas와 비교
+        series = to_series(edge_returns()['random'])
+        dd = drawdown_ref(series).values
+        n = series.size
+        for window, MDD_window in ((0, MDD_WINDOW), (WINDOW, 0), (1, 1), (n + 1, n + 1)):
+            with self.subTest(window=window, MDD_window=MDD_window):
+                actual = _rolling_all(series.values, dd, window, MDD_window,
+                                      0.04, 0.03, DELTA, SCALE)
+                if window < 1:
+                    expected = dict.fromkeys(('sharp', 'sortino', 'VaR_ratio', 'CVaR_ratio',
+                                              'hit', 'GtP', 'calmar'), np.full(n, np.nan))
+                else:
+                    expected = rolling_all_ref(series, window, max(MDD_window, 0))
+                for (key, value), result in zip(expected.items(), actual):
+                    self.assertAllClose(result, value, name=key)
+
+
+class RollingMetricTest(KernelTestCase):
+
+    def test_rolling_metric_matches_per_metric(self):
+        # 한 번에 계산한 결과와 NaN 경로(지표별 롤링 계산)의 결과가 같아야 함
+        def check(name, rets, series):
+            metric = Metric(series.add(1).cumprod(), 'day')
+            result = metric.rolling_metric(series, lookback=0.1, MDD_lookback=0.25)
+            rolling = dict(returns=series, rolling=True, lookback=0.1)
+            expected = {
+                'sharp': metric.sharp_ratio(**rolling),
+                'sortino': metric.sortino_ratio(**rolling),
+                'calmar': metric.calmar_ratio(MDD_lookback=0.25, **rolling),
+                'VaR_ratio': metric.VaR_ratio(**rolling),
+                'CVaR_ratio': metric.CVaR_ratio(**rolling),
+                'hit': metric.hit_ratio(**rolling),
+                'GtP': metric.GtP_ratio(**rolling),
+            }
+            for key, value in expected.items():
+                self.assertAllClose(result[key], value, name=f'{name} {key}')
+        self.for_each_case(check)
+
+    def test_calmar_zero_MDD_window(self):
+        # MDD_lookback이 0 윈도우로 내림되는 경우 (int(0.05 * 12) == 0)
+        series = to_series(edge_returns()['random'])
+        metric = Metric(series.add(1).cumprod(), 'month')
+        calmar = metric.calmar_ratio(rolling=True, MDD_lookback=0.05)
+        self.assertTrue(calmar.isna().all())
+
+    def test_rolling_metric_short_windows(self):
+        # lookback/MDD_lookback이 0 윈도우로 내림되어도 프로세스가 죽지 않고 NaN을 반환
+        series = to_series(edge_returns()['random'])
+        metric = Metric(series.add(1).cumprod(), 'year')
+        result = metric.rolling_metric(lookback=0.5)
+        self.assertTrue(result.drop(columns=['dd', 'ddur']).isna().all().all())
+        result = metric.rolling_metric(lookback=2, MDD_lookback=0.5)
+        self.assertTrue(result['calmar'].isna().all())
+
+    def test_zero_lookback(self):
+        # 월간 수익률에서 lookback=0.05는 0 윈도우 (int(0.05 * 12) == 0)
+        series = to_series(edge_returns()['random'])
+        metric = Metric(series.add(1).cumprod(), 'month')
+        for method in ('sharp_ratio', 'sortino_ratio', 'CVaR_ratio', 'hit_ratio', 'GtP_ratio'):
+            with self.subTest(method=method):
+                result = getattr(metric, method)(rolling=True, lookback=0.05)
+                self.assertTrue(result.isna().all())
+
+
+class DrawdownCacheTest(KernelTestCase):
+
+    def test_drawdown_returns_copy(self):
+        # 반환된 drawdown을 변경해도 인스턴스의 MDD, duration, calmar는 바뀌지 않아야 함
+        series = to_series(edge_returns()['random'])
+        metric = Metric(series.add(1).cumprod(), 'day')
+        MDD, calmar = metric.MDD(), metric.calmar_ratio()
+        ddur = metric.drawdown_duration()
+        dd = metric.drawdown()
+        dd.iloc[:] = -0.99
+        self.assertEqual(metric.MDD(), MDD)
+        self.assertEqual(metric.calmar_ratio(), calmar)
+        self.assertTrue(metric.drawdown_duration().equals(ddur))
+        self.assertAllClose(metric.drawdown(), drawdown_ref(metric.rets))
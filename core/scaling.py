@@ -4,6 +4,8 @@
 self.freq = convert_freq(freq)
 self.param = annualize_scaler(self.freq)
 """
+from types import MappingProxyType
+
 def convert_freq(freq: str) -> str:
     convert = {
         'day': 'day',
@@ -30,20 +32,20 @@ def convert_freq(freq: str) -> str:
     }
     return convert[freq]
 
+# 주기별 연율화 파라미터 (호출마다 새로 만들지 않도록 모듈 레벨에 읽기 전용으로 둠)
+ANNUALIZE_SCALE = MappingProxyType({
+    'day': 252,
+    'week': 52,
+    'month': 12,
+    'quarter': 4,
+    'halfyear': 2,
+    'year': 1
+})
+
 def annualize_scaler(freq: str) -> int:
     # 주기에 따른 연율화 파라미터 반환해주는 함수
-    annualize_scale_dict = {
-        'day': 252,
-        'week': 52,
-        'month': 12,
-        'quarter': 4,
-        'halfyear': 2,
-        'year': 1
-    }
     try:
-        scale: int = annualize_scale_dict[freq]
-    except:
-        raise Exception("freq is only ['day', 'week', 'month', \
-            'quarter', 'half-year', 'year']")
-    
-    return scale
\ No newline at end of file
+        return ANNUALIZE_SCALE[freq]
+    except KeyError:
+        raise ValueError("freq is only ['day', 'week', 'month', "
+                         "'quarter', 'half-year', 'year']")
@@ -1,7 +1,7 @@
 # !pip install yfinance --quiet
 import yfinance as yf
+import numpy as np
 import pandas as pd
-from functools import reduce
 
 from core.scaling import convert_freq, annualize_scaler
 
@@ -12,6 +12,7 @@ def get_price(tickers: list, period: str, interval: str, start_date: str=None) -
     Args:
         tickers (list): 
             - list -> 원하는 종목의 티커 리스트
+            - str -> 종목 하나의 티커
         period (str): 
             - str -> 데이터를 다운받을 기간을 설정. 기본값은 한달(1mo). (1d, 5d, 1mo, 3mo, 6mo, 1y, 2y, 5y, 10y, ytd, max)
         interval (str): 
@@ -28,18 +29,19 @@ def get_price(tickers: list, period: str, interval: str, start_date: str=None) -
         pd.DataFrame -> 금융상품 가격정보를 담고있는 df
     """
     
-    temp = []
-    
-    for ticker in tickers:
-        #start = time.time()
-        name = f'{ticker}'
-        name = yf.Ticker(ticker)
-        temp_df = name.history(start=start_date, period=period, interval=interval)['Close']
-        temp.append(temp_df)
-        #end = time.time()
-        #print(f'loop time: {end - start}s')
-            
-    price_df = pd.concat(temp, axis = 1)
+    # 티커 하나를 문자열로 넘기면 글자 단위로 순회하지 않도록 리스트로 감쌈
+    if isinstance(tickers, str):
+        tickers = [tickers]
+    
+    # 전체 티커를 한번에 병렬로 다운로드 (history와 같은 수정주가 사용)
+    price_df = yf.download(tickers, start=start_date, period=period, interval=interval,
+                           auto_adjust=True, progress=False, threads=True)['Close']
+    
+    if isinstance(price_df, pd.Series):
+        price_df = price_df.to_frame(tickers[0].upper())
+    
+    # yf.download는 티커를 대문자로 바꾸고 알파벳순으로 정렬하므로 입력 순서와 이름으로 되돌림
+    price_df = price_df[[ticker.upper() for ticker in tickers]]
     price_df.columns = tickers
 
     if interval in ['1d', '5d', '1wk', '1mo', '3mo']:
@@ -70,8 +72,9 @@ def add_cash(price: pd.DataFrame, num_day_in_year:int, yearly_rfr: int) -> pd.Da
 
     temp_df = price.copy()
 
-    temp_df['CASH'] = yearly_rfr/num_day_in_year
-    temp_df['CASH'] = (1 + temp_df['CASH']).cumprod()
+    # 일별 이자율이 상수이므로 누적곱 대신 거듭제곱으로 계산
+    daily_rfr = yearly_rfr / num_day_in_year
+    temp_df['CASH'] = np.power(1 + daily_rfr, np.arange(1, len(temp_df) + 1))
     temp_df.dropna(inplace = True)
     temp_df.index.name = "date_time"
 
@@ -97,22 +100,12 @@ def rebal_dates(price: pd.DataFrame, period: str, include_first_date: bool=False
     first_date = price.index[0]
     last_date = price.index[-1]
     
-    _price = price.reset_index()
-    colname = _price.columns[0]
+    # 월 단위 Period 서수를 주기의 개월 수로 나눈 값 하나를 그룹 키로 사용
+    months_in_period = {'month': 1, 'quarter': 3, 'halfyear': 6, 'year': 12}[period]
+    period_key = price.index.to_period('M').asi8 // months_in_period
     
-    if period == "month":
-        groupby = [_price[colname].dt.year, _price[colname].dt.month]
-        
-    elif period == "quarter":
-        groupby = [_price[colname].dt.year, _price[colname].dt.quarter]
-        
-    elif period == "halfyear":
-        groupby = [_price[colname].dt.year, _price[colname].dt.month // 7]
-        
-    elif period == "year":
-        groupby = [_price[colname].dt.year, _price[colname].dt.year]
-    
-    rebal_dates = pd.to_datetime(_price.groupby(groupby)[colname].last().values)
+    dates = pd.Series(price.index)
+    rebal_dates = pd.to_datetime(dates.groupby(period_key).last().values)
     
     if include_first_date:
         rebal_dates = rebal_dates.append(pd.to_datetime([first_date]))
@@ -144,58 +137,40 @@ def price_on_rebal(price: pd.DataFrame, rebal_dates: list) -> pd.DataFrame:
 def calculate_portvals(price_df: pd.DataFrame, weight_df: pd.DataFrame, 
     signal_df: pd.DataFrame, long_only: str) -> pd.DataFrame:
     
-    cum_rtn_up_until_now = 1 
-    individual_port_val_df_list = []
-    prev_end_day = weight_df.index[0]
-    
-    if long_only: 
-        for end_day in weight_df.index[1:]:
-            sub_price_df = price_df.loc[prev_end_day:end_day]
-            sub_asset_flow_df = sub_price_df / sub_price_df.iloc[0]
-            
-            weight_series = weight_df.loc[prev_end_day]
-            indi_port_cum_rtn_series = (sub_asset_flow_df * weight_series) * cum_rtn_up_until_now
-        
-            individual_port_val_df_list.append(indi_port_cum_rtn_series)
-
-            total_port_cum_rtn_series = indi_port_cum_rtn_series.sum(axis=1)
-            cum_rtn_up_until_now = total_port_cum_rtn_series.iloc[-1]
-
-            prev_end_day = end_day
-
-        individual_port_val_df = reduce(lambda x, y: pd.concat([x, y.iloc[1:]]), individual_port_val_df_list)
-        return individual_port_val_df
+    # 리밸런싱 날짜의 위치, 첫 리밸런싱 ~ 마지막 리밸런싱 구간만 사용
+    rebal_pos = price_df.index.searchsorted(weight_df.index)
+    price_df = price_df.iloc[rebal_pos[0]:rebal_pos[-1] + 1]
+    rebal_pos = rebal_pos - rebal_pos[0]
+    
+    # 각 날짜가 속한 리밸런싱 구간 번호 (리밸런싱 날짜는 직전 구간의 마지막 날)
+    segment = np.searchsorted(rebal_pos, np.arange(len(price_df))) - 1
+    segment[0] = 0
+    
+    start_price_df = price_df.iloc[rebal_pos[segment]].set_axis(price_df.index)
+    asset_flow_df = price_df / start_price_df
+    weight = weight_df.iloc[segment].set_axis(price_df.index)
+    
+    if long_only:
+        indi_port_cum_rtn_df = asset_flow_df * weight
     
     else:
-        for end_day in weight_df.index[1:]:
-            sub_price_df = price_df.loc[prev_end_day:end_day]
-            signal_series = signal_df.loc[prev_end_day]
-
-            long_signal = signal_series.replace({-1: 0})
-            short_signal = signal_series.replace({1: 0, -1: 1})
-
-            sub_price_df_reverse = sub_price_df.sort_index(ascending=False)
-            
-            sub_asset_flow_df = sub_price_df/sub_price_df.iloc[0]
-            sub_asset_flow_df_reverse = sub_price_df_reverse/sub_price_df_reverse.iloc[0]
-
-            weight_series = weight_df.loc[prev_end_day]
-            long_weight_series = weight_series * long_signal
-            short_weight_series = weight_series * short_signal
-            
-            indi_port_cum_rtn_series = (sub_asset_flow_df * long_weight_series) * cum_rtn_up_until_now \
-                + (sub_asset_flow_df_reverse * short_weight_series) * cum_rtn_up_until_now
+        signal = signal_df.loc[weight_df.index].iloc[segment].set_axis(price_df.index)
         
-            individual_port_val_df_list.append(indi_port_cum_rtn_series)
-
-            total_port_cum_rtn_series = indi_port_cum_rtn_series.sum(axis=1)
-            cum_rtn_up_until_now = total_port_cum_rtn_series.iloc[-1]
-
-            prev_end_day = end_day 
-
-        individual_port_val_df = reduce(lambda x, y: pd.concat([x, y.iloc[1:]]), individual_port_val_df_list)
-
-        return individual_port_val_df
+        long_signal = signal.replace({-1: 0})
+        short_signal = signal.replace({1: 0, -1: 1})
+        
+        end_price_df = price_df.iloc[rebal_pos[segment + 1]].set_axis(price_df.index)
+        asset_flow_df_reverse = price_df / end_price_df
+        
+        indi_port_cum_rtn_df = asset_flow_df * (weight * long_signal) \
+            + asset_flow_df_reverse * (weight * short_signal)
+    
+    # 구간별 수익률을 누적해서 각 구간 시작 시점의 포트폴리오 가치를 계산
+    segment_rtn = indi_port_cum_rtn_df.sum(axis=1).values[rebal_pos[1:]]
+    cum_rtn_up_until_now = np.cumprod(np.r_[1, segment_rtn[:-1]])
+    
+    individual_port_val_df = indi_port_cum_rtn_df.mul(cum_rtn_up_until_now[segment], axis=0)
+    return individual_port_val_df
 
 def port_rets(portvals_df: pd.DataFrame, cumulative: bool=True) -> pd.Series:
     
@@ -214,4 +189,8 @@ def port_rets(portvals_df: pd.DataFrame, cumulative: bool=True) -> pd.Series:
         return portvals_df.sum(axis=1) 
     
     else: 
-        return portvals_df.sum(axis=1).pct_change().fillna(0)
+        # 총자산 합계와 일별 수익률을 pandas 연산 없이 배열에서 바로 계산
+        port_val = np.nansum(portvals_df.values.astype(np.float64), axis=1)
+        daily_rets = np.zeros_like(port_val)
+        daily_rets[1:] = port_val[1:] / port_val[:-1] - 1
+        return pd.Series(daily_rets, index=portvals_df.index).fillna(0)
@@ -1,3 +1,147 @@
-from django.test import TestCase
+from functools import reduce
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+import pandas as pd
+
+from django.test import SimpleTestCase
+
+from price.services.price_processing import (
+    get_price, add_cash, rebal_dates, calculate_portvals, port_rets,
+)
+
+
+def make_price(periods: int=600) -> pd.DataFrame:
+    # 월/분기/반기/연 경계를 모두 포함하는 영업일 가격표 (마지막 달은 중간에 끝남)
+    rng = np.random.default_rng(0)
+    rets = rng.normal(0.0003, 0.01, (periods, 3))
+    index = pd.bdate_range('2018-01-01', periods=periods)
+    return pd.DataFrame(np.cumprod(1 + rets, axis=0) * [10, 50, 100],
+                        index=index, columns=['A', 'B', 'C'])
+
+
+# 벡터화 이전 구현과 같은 계산식
+def add_cash_ref(price: pd.DataFrame, num_day_in_year: int, yearly_rfr: float) -> pd.DataFrame:
+    temp_df = price.copy()
+    temp_df['CASH'] = yearly_rfr / num_day_in_year
+    temp_df['CASH'] = (1 + temp_df['CASH']).cumprod()
+    temp_df.dropna(inplace=True)
+    temp_df.index.name = "date_time"
+    return temp_df
+
+def rebal_dates_ref(price: pd.DataFrame, period: str, include_first_date: bool=False):
+    first_date = price.index[0]
+    last_date = price.index[-1]
+
+    _price = price.reset_index()
+    colname = _price.columns[0]
+
+    if period == "month":
+        groupby = [_price[colname].dt.year, _price[colname].dt.month]
+    elif period == "quarter":
+        groupby = [_price[colname].dt.year, _price[colname].dt.quarter]
+    elif period == "halfyear":
+        groupby = [_price[colname].dt.year, _price[colname].dt.month // 7]
+    elif period == "year":
+        groupby = [_price[colname].dt.year, _price[colname].dt.year]
+
+    rebal_dates = pd.to_datetime(_price.groupby(groupby)[colname].last().values)
+
+    if include_first_date:
+        rebal_dates = rebal_dates.append(pd.to_datetime([first_date]))
+        rebal_dates = rebal_dates.sort_values()
+
+    if rebal_dates[-1] > last_date:
+        return rebal_dates[:-1]
+    else:
+        return rebal_dates
+
+def calculate_portvals_ref(price_df, weight_df, signal_df, long_only) -> pd.DataFrame:
+    cum_rtn_up_until_now = 1
+    individual_port_val_df_list = []
+    prev_end_day = weight_df.index[0]
+
+    for end_day in weight_df.index[1:]:
+        sub_price_df = price_df.loc[prev_end_day:end_day]
+        sub_asset_flow_df = sub_price_df / sub_price_df.iloc[0]
+        weight_series = weight_df.loc[prev_end_day]
+
+        if long_only:
+            indi_port_cum_rtn_series = (sub_asset_flow_df * weight_series) * cum_rtn_up_until_now
+        else:
+            signal_series = signal_df.loc[prev_end_day]
+            long_signal = signal_series.replace({-1: 0})
+            short_signal = signal_series.replace({1: 0, -1: 1})
+
+            sub_price_df_reverse = sub_price_df.sort_index(ascending=False)
+            sub_asset_flow_df_reverse = sub_price_df_reverse / sub_price_df_reverse.iloc[0]
+
+            indi_port_cum_rtn_series = \
+                (sub_asset_flow_df * (weight_series * long_signal)) * cum_rtn_up_until_now \
+                + (sub_asset_flow_df_reverse * (weight_series * short_signal)) * cum_rtn_up_until_now
+
+        individual_port_val_df_list.append(indi_port_cum_rtn_series)
+        cum_rtn_up_until_now = indi_port_cum_rtn_series.sum(axis=1).iloc[-1]
+        prev_end_day = end_day
+
+    return reduce(lambda x, y: pd.concat([x, y.iloc[1:]]), individual_port_val_df_list)
+
+def port_rets_ref(portvals_df: pd.DataFrame, cumulative: bool=True) -> pd.Series:
+    if cumulative:
+        return portvals_df.sum(axis=1)
+    return portvals_df.sum(axis=1).pct_change().fillna(0)
+
+
+class PriceProcessingTest(SimpleTestCase):
+
+    def assertFrameClose(self, actual, expected):
+        assert_equal = pd.testing.assert_frame_equal if isinstance(expected, pd.DataFrame) \
+            else pd.testing.assert_series_equal
+        assert_equal(actual, expected, check_exact=False, rtol=1e-12, check_freq=False,
+                     check_names=False)
+
+    def test_add_cash(self):
+        price = make_price()
+        self.assertFrameClose(add_cash(price, 252, 0.03), add_cash_ref(price, 252, 0.03))
+
+    def test_rebal_dates(self):
+        price = make_price()
+        for period in ('month', 'quarter', 'halfyear', 'year'):
+            for include_first_date in (False, True):
+                with self.subTest(period=period, include_first_date=include_first_date):
+                    actual = rebal_dates(price.copy(), period, include_first_date)
+                    expected = rebal_dates_ref(price.copy(), period, include_first_date)
+                    pd.testing.assert_index_equal(actual, expected, check_names=False)
+
+    def test_calculate_portvals(self):
+        # 롱온리/롱숏, 월/분기 리밸런싱, 첫 날 포함 여부별로 구간 계산이 기존 반복문과 같아야 함
+        price = make_price()
+        rng = np.random.default_rng(1)
+        for period in ('month', 'quarter'):
+            for include_first_date in (False, True):
+                dates = rebal_dates(price.copy(), period, include_first_date)
+                weight = rng.random((len(dates), price.shape[1]))
+                weight_df = pd.DataFrame(weight / weight.sum(axis=1, keepdims=True),
+                                         index=dates, columns=price.columns)
+                signal_df = pd.DataFrame(rng.choice([1, -1], size=weight.shape),
+                                         index=dates, columns=price.columns)
+                for long_only in (True, False):
+                    with self.subTest(period=period, include_first_date=include_first_date,
+                                      long_only=long_only):
+                        actual = calculate_portvals(price, weight_df, signal_df, long_only)
+                        expected = calculate_portvals_ref(price, weight_df, signal_df, long_only)
+                        self.assertFrameClose(actual, expected)
+                        for cumulative in (True, False):
+                            self.assertFrameClose(port_rets(actual, cumulative),
+                                                  port_rets_ref(expected, cumulative))
+
+    def test_get_price_single_ticker_string(self):
+        # yf.download는 티커를 대문자로 바꾸므로 입력한 이름으로 되돌려야 함
+        price = make_price()[['A']].rename(columns={'A': 'SPY'})
+        download = pd.concat({'Close': price}, axis=1)
+        with mock.patch('price.services.price_processing.yf.download', return_value=download):
+            for tickers in ('spy', ['spy']):
+                with self.subTest(tickers=tickers):
+                    result = get_price(tickers, period='max', interval='1d')
+                    self.assertEqual(list(result.columns), ['spy'])
+                    np.testing.assert_allclose(result['spy'].values, price['SPY'].values)